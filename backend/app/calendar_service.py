@@ -23,13 +23,12 @@ def build_preview(
         
     doc_title = (title_override or reg.name).strip() or reg.name
     
-    # 2. Map therapies to days
-    day_map = {}
+    # 2. Map therapies to days (list indexed by cycle day; 0 unused)
+    day_map: List[List[str]] = [[] for _ in range(cycle_len + 1)]
     for t in reg.therapies:
-        active_days = parse_day_spec(t.duration)
-        for d in active_days:
-            if d not in day_map:
-                day_map[d] = []
+        for d in parse_day_spec(t.duration):  # ascending
+            if d > cycle_len:
+                break
             day_map[d].append(t.name)
     
     # 3. Grid Bounds (Expand to full Sun-Sat weeks)
@@ -49,7 +48,7 @@ def build_preview(
             
             labels = []
             if is_active:
-                drugs = day_map.get(cycle_day, [])
+                drugs = day_map[cycle_day]
                 if drugs:
                     labels.extend(drugs)
                 else:
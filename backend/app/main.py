@@ -4,6 +4,7 @@ import datetime as dt
 import io
 import logging
 import os
+import re
 import tempfile
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -48,9 +49,14 @@ def _cycle_label(phase: str, cycle_num: int | None) -> str:
     if phase == "Induction": return "Induction"
     return f"Cycle {cycle_num or 1}"
 
+_SAFE_FN_TABLE = {i: (chr(i) if chr(i).isalnum() or chr(i) in "_-" else ("_" if chr(i).isspace() else None)) for i in range(128)}
+_FN_SPACE_RE = re.compile(r"\s")
+_FN_UNSAFE_RE = re.compile(r"[^\w-]")  # \w is isalnum() plus "_"
+
 def _safe_filename(s: str) -> str:
     s = (s or "").strip()
-    return "".join(ch if ch.isalnum() or ch in ("_", "-") else ("_" if ch.isspace() else "") for ch in s) or "calendar"
+    if s.isascii(): return s.translate(_SAFE_FN_TABLE) or "calendar"
+    return _FN_UNSAFE_RE.sub("", _FN_SPACE_RE.sub("_", s)) or "calendar"
 
 @app.get("/")
 def root(): return {"name": "Chemo Calendar API", "ok": True}
@@ -112,7 +118,7 @@ def rename_regimen(body: RenameRegimenRequest, bank: PgBank = Depends(get_bank))
     if old == new: return {"ok": True}
     r = bank.get_regimen(old)
     if not r: raise HTTPException(status_code=404, detail="Regimen not found")
-    if bank.get_regimen(new): raise HTTPException(status_code=409, detail="A regimen with new_name already exists")
+    if bank.exists(new): raise HTTPException(status_code=409, detail="A regimen with new_name already exists")
     bank.save_as(r, new)
     bank.delete_regimen(old)
     return {"ok": True}
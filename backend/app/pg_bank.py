@@ -81,6 +81,10 @@ class PgBank:
                     (reg_id, t.name, t.route, t.dose, t.frequency, t.duration, total_doses, opts_json)
                 )
 
+    def exists(self, name: str) -> bool:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT 1 FROM regimens WHERE name = %s LIMIT 1", (name.strip(),)).fetchone() is not None
+
     def delete_regimen(self, name: str) -> bool:
         with self.pool.connection() as conn: return conn.execute("DELETE FROM regimens WHERE name = %s", (name.strip(),)).rowcount > 0
 
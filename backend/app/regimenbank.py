@@ -3,7 +3,10 @@ from __future__ import annotations
 
 import argparse
 import calendar as cal
+import copy
 import datetime as dt
+import functools
+import io
 import os
 import re
 import sqlite3
@@ -11,29 +14,58 @@ import sys
 import time
 from dataclasses import dataclass, asdict, field, replace
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Any, Dict, List, Optional, Tuple
 
 # ---------------- config ----------------
 SCHEMA_VERSION = 3
 DEFAULT_DB = Path(__file__).resolve().parent / "regimenbank.db"
 ROUTES = ["IV", "PO", "SQ", "IM", "IT"]
-
-def _supports_ansi() -> bool:
-    return sys.stdout.isatty() and (
-        os.name != "nt" or "WT_SESSION" in os.environ or "TERM" in os.environ
-    )
+_REST_LABEL = ("Rest",)
+_DOCX_WRITE_BUFFER = max(io.DEFAULT_BUFFER_SIZE, 128 * 1024)
+_DAY_PREFIX_RE = re.compile(r"^days?\s*[:\-]?\s*")
+_TOK_SPLIT_RE = re.compile(r"[,\s]+")
+
+# Connection setup, applied in one call when a bank is opened
+_SQL_PRAGMAS = """
+PRAGMA foreign_keys = ON;
+PRAGMA busy_timeout = 5000;
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -8192;
+PRAGMA mmap_size = 268435456;
+"""
+
+# SQL used by RegimenBank
+_SQL_LIST = "SELECT name FROM regimens ORDER BY name COLLATE NOCASE"
+_SQL_GET_REGIMEN = "SELECT id, name, disease_state, notes, on_study FROM regimens WHERE name = ?"
+_SQL_GET_THERAPIES = "SELECT name, route, dose, frequency, duration, total_doses FROM therapies WHERE regimen_id = ? ORDER BY id"
+_SQL_UPSERT_REGIMEN = (
+    "INSERT INTO regimens(name, disease_state, notes, on_study, updated_at) VALUES(?, ?, ?, ?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET disease_state = excluded.disease_state, notes = excluded.notes, "
+    "on_study = excluded.on_study, updated_at = excluded.updated_at RETURNING id"
+)
+_SQL_DELETE_THERAPIES = "DELETE FROM therapies WHERE regimen_id = ?"
+_SQL_INSERT_THERAPY = "INSERT INTO therapies(regimen_id, name, route, dose, frequency, duration, total_doses) VALUES(?, ?, ?, ?, ?, ?, ?)"
+_SQL_EXISTS = "SELECT 1 FROM regimens WHERE name = ? LIMIT 1"
+_SQL_DELETE = "DELETE FROM regimens WHERE name = ?"
+
+_ANSI_OK: bool = sys.stdout.isatty() and (
+    os.name != "nt" or "WT_SESSION" in os.environ or "TERM" in os.environ
+)
 
 def _italic(s: str) -> str:
-    return f"\x1b[3m{s}\x1b[0m" if _supports_ansi() else s
+    return f"\x1b[3m{s}\x1b[0m" if _ANSI_OK else s
 
 # ADDED: Missing TherapyOption dataclass required by pg_bank.py
-@dataclass
+@dataclass(slots=True)
 class TherapyOption:
     dose: str
     duration: str
     total_doses: Optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class Chemotherapy:
     name: str
     route: str
@@ -58,7 +90,7 @@ class Chemotherapy:
             d["name"], d["route"], d["dose"], d["frequency"], d["duration"], d.get("total_doses"), parsed_opts
         )
 
-@dataclass
+@dataclass(slots=True)
 class Regimen:
     name: str
     disease_state: Optional[str] = None
@@ -91,94 +123,79 @@ class RegimenBank:
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.conn.execute("PRAGMA foreign_keys = ON")
-        self.conn.execute("PRAGMA busy_timeout = 5000")
+        self.conn.executescript(_SQL_PRAGMAS)
         self._init_schema()
 
     def _init_schema(self) -> None:
-        cur = self.conn.cursor()
-        cur.execute("""
+        self.conn.executescript("""
             CREATE TABLE IF NOT EXISTS regimens (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE,
                 disease_state TEXT, on_study INTEGER NOT NULL DEFAULT 0,
                 notes TEXT, updated_at TEXT NOT NULL
-            )
-        """)
-        cur.execute("""
+            );
             CREATE TABLE IF NOT EXISTS therapies (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, regimen_id INTEGER NOT NULL,
                 name TEXT NOT NULL, route TEXT NOT NULL, dose TEXT NOT NULL,
                 frequency TEXT NOT NULL, duration TEXT NOT NULL, total_doses INTEGER,
                 FOREIGN KEY (regimen_id) REFERENCES regimens(id) ON DELETE CASCADE
-            )
+            );
+            CREATE INDEX IF NOT EXISTS idx_therapies_regimen ON therapies(regimen_id);
         """)
-        cur.execute("PRAGMA table_info(regimens)")
-        rcols = [row["name"] for row in cur.fetchall()]
-        if "on_study" not in rcols:
-            cur.execute("ALTER TABLE regimens ADD COLUMN on_study INTEGER NOT NULL DEFAULT 0")
-        cur.execute("PRAGMA table_info(therapies)")
-        cols = [row["name"] for row in cur.fetchall()]
-        if "total_doses" not in cols:
-            cur.execute("ALTER TABLE therapies ADD COLUMN total_doses INTEGER")
+        cur = self.conn.cursor()
+        # column migrations for banks created by older versions; skipped once user_version is current
+        if cur.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            cur.execute("PRAGMA table_info(regimens)")
+            rcols = [row[1] for row in cur.fetchall()]
+            if "on_study" not in rcols:
+                cur.execute("ALTER TABLE regimens ADD COLUMN on_study INTEGER NOT NULL DEFAULT 0")
+            cur.execute("PRAGMA table_info(therapies)")
+            cols = [row[1] for row in cur.fetchall()]
+            if "total_doses" not in cols:
+                cur.execute("ALTER TABLE therapies ADD COLUMN total_doses INTEGER")
+            cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         self.conn.commit()
 
     def list_regimens(self) -> List[str]:
-        cur = self.conn.execute("SELECT name FROM regimens ORDER BY name COLLATE NOCASE")
-        return [row["name"] for row in cur.fetchall()]
+        cur = self.conn.execute(_SQL_LIST)
+        return [row[0] for row in cur]
 
     def get_regimen(self, name: str) -> Optional[Regimen]:
         name = name.strip()
-        cur = self.conn.execute(
-            "SELECT id, name, disease_state, notes, on_study FROM regimens WHERE name = ?", (name,)
-        )
+        cur = self.conn.execute(_SQL_GET_REGIMEN, (name,))
         row = cur.fetchone()
         if not row: return None
 
-        reg_id = row["id"]
-        cur_t = self.conn.execute(
-            "SELECT name, route, dose, frequency, duration, total_doses FROM therapies WHERE regimen_id = ? ORDER BY id",
-            (reg_id,)
-        )
-        therapies = [
-            Chemotherapy(trow["name"], trow["route"], trow["dose"], trow["frequency"], trow["duration"], trow["total_doses"])
-            for trow in cur_t.fetchall()
-        ]
+        reg_id = row[0]
+        cur_t = self.conn.execute(_SQL_GET_THERAPIES, (reg_id,))
+        # rows are plain tuples in Chemotherapy's positional field order
+        therapies = [Chemotherapy(*trow) for trow in cur_t]
 
         return Regimen(
-            name=row["name"], disease_state=row["disease_state"], on_study=bool(row["on_study"]),
-            notes=row["notes"], therapies=therapies,
+            name=row[1], disease_state=row[2], on_study=bool(row[4]),
+            notes=row[3], therapies=therapies,
         )
 
+    def exists(self, name: str) -> bool:
+        return self.conn.execute(_SQL_EXISTS, (name.strip(),)).fetchone() is not None
+
     def upsert_regimen(self, reg: Regimen) -> None:
         now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
         with self.conn:
-            cur = self.conn.execute("SELECT id FROM regimens WHERE name = ?", (reg.name,))
-            row = cur.fetchone()
-            if row:
-                reg_id = row["id"]
-                self.conn.execute(
-                    "UPDATE regimens SET disease_state = ?, notes = ?, on_study = ?, updated_at = ? WHERE id = ?",
-                    (reg.disease_state, reg.notes, int(reg.on_study), now, reg_id),
-                )
-                self.conn.execute("DELETE FROM therapies WHERE regimen_id = ?", (reg_id,))
-            else:
-                self.conn.execute(
-                    "INSERT INTO regimens(name, disease_state, notes, on_study, updated_at) VALUES(?, ?, ?, ?, ?)",
-                    (reg.name, reg.disease_state, reg.notes, int(reg.on_study), now),
-                )
-                reg_id = self.conn.execute("SELECT id FROM regimens WHERE name = ?", (reg.name,)).fetchone()["id"]
-
-            for t in reg.therapies:
-                total_doses = t.total_doses if t.total_doses is not None else len(parse_day_spec(t.duration))
-                self.conn.execute(
-                    "INSERT INTO therapies(regimen_id, name, route, dose, frequency, duration, total_doses) VALUES(?, ?, ?, ?, ?, ?, ?)",
-                    (reg_id, t.name, t.route, t.dose, t.frequency, t.duration, total_doses),
-                )
+            reg_id = self.conn.execute(
+                _SQL_UPSERT_REGIMEN, (reg.name, reg.disease_state, reg.notes, int(reg.on_study), now)
+            ).fetchone()[0]
+            self.conn.execute(_SQL_DELETE_THERAPIES, (reg_id,))
+
+            rows = [
+                (reg_id, t.name, t.route, t.dose, t.frequency, t.duration,
+                 t.total_doses if t.total_doses is not None else len(parse_day_spec(t.duration)))
+                for t in reg.therapies
+            ]
+            self.conn.executemany(_SQL_INSERT_THERAPY, rows)
 
     def delete_regimen(self, name: str) -> bool:
         with self.conn:
-            cur = self.conn.execute("DELETE FROM regimens WHERE name = ?", (name.strip(),))
+            cur = self.conn.execute(_SQL_DELETE, (name.strip(),))
             return cur.rowcount > 0
 
     def save_as(self, reg: Regimen, new_name: str) -> None:
@@ -186,16 +203,23 @@ class RegimenBank:
         self.upsert_regimen(r2)
 
     def close(self) -> None:
+        try: self.conn.execute("PRAGMA optimize")  # refresh planner stats only where SQLite thinks they help
+        except Exception: pass
         try: self.conn.close()
         except Exception: pass
 
-def parse_day_spec(day_spec: str) -> List[int]:
-    if not day_spec: return []
+@functools.lru_cache(maxsize=512)
+def parse_day_spec(day_spec: str) -> Tuple[int, ...]:
+    """Sorted, de-duplicated day numbers (>= 1) named by a spec like "Days 1-7, 15".
+
+    Memoized, so the result is an immutable tuple shared between callers.
+    """
+    if not day_spec: return ()
     s = day_spec.replace("–", "-").strip().lower()
-    s = re.sub(r"^days?\s*[:\-]?\s*", "", s)
-    if not s: return []
+    s = _DAY_PREFIX_RE.sub("", s)
+    if not s: return ()
 
-    tokens = re.split(r"[,\s]+", s)
+    tokens = _TOK_SPLIT_RE.split(s)
     out: List[int] = []
 
     for tok in tokens:
@@ -204,69 +228,111 @@ def parse_day_spec(day_spec: str) -> List[int]:
             try:
                 a_str, b_str = tok.split("-", 1)
                 a, b = int(a_str), int(b_str)
-                if a <= b: out.extend(range(a, b + 1))
+                if a <= b: out.extend(range(max(a, 1), b + 1))
             except ValueError: continue
         else:
-            try: out.append(int(tok))
+            try: d = int(tok)
             except ValueError: continue
+            if d >= 1: out.append(d)
 
-    return sorted(set(d for d in out if d >= 1))
+    return tuple(sorted(set(out)))
 
 def compute_calendar_grid(reg: Regimen, start: dt.date, cycle_len: int):
-    max_day = cycle_len
-    by_day: Dict[int, List[str]] = {d: [] for d in range(1, cycle_len + 1)}
+    max_day = cycle_len  # doses past the cycle are dropped, so the grid never runs longer
+    by_day: List[List[str]] = [[] for _ in range(cycle_len + 1)]  # indexed by cycle day; 0 unused
     for t in reg.therapies:
-        dlist = [d for d in parse_day_spec(t.duration) if d <= cycle_len]
-        if dlist:
-            max_day = max(max_day, max(dlist))
-            for d in dlist: by_day.setdefault(d, []).append(t.name)
+        for d in parse_day_spec(t.duration):  # ascending
+            if d > cycle_len: break
+            by_day[d].append(t.name)
+    all_rest = not any(by_day)
 
     first_sun = start - dt.timedelta(days=(start.weekday() + 1) % 7)
     last_needed = start + dt.timedelta(days=max_day - 1)
     last_sat = last_needed + dt.timedelta(days=(5 - last_needed.weekday()) % 7)
 
+    # Sunday..Saturday always spans whole weeks, so cells are walked by ordinal in strides of 7.
+    base = first_sun.toordinal()
+    day1 = start.toordinal() - base  # cell index of cycle day 1
+    total = last_sat.toordinal() - base + 1
+    from_ordinal = dt.date.fromordinal
     grid: List[List[Dict[str, Any]]] = []
-    d = first_sun
-    week: List[Dict[str, Any]] = []
-    while d <= last_sat:
-        entry: Dict[str, Any] = {"date": d, "cycle_day": None, "labels": []}
-        if d >= start:
-            cd = (d - start).days + 1
+    for w in range(0, total, 7):
+        week: List[Dict[str, Any]] = []
+        for i in range(w, w + 7):
+            cd = i - day1 + 1
             if 1 <= cd <= max_day:
-                entry["cycle_day"] = cd
-                entry["labels"] = by_day.get(cd, []) or ["Rest"]
-        week.append(entry)
-        if len(week) == 7:
-            grid.append(week)
-            week = []
-        d += dt.timedelta(days=1)
-    if week:
-        while len(week) < 7:
-            week.append({"date": d, "cycle_day": None, "labels": []})
-            d += dt.timedelta(days=1)
+                week.append({"date": from_ordinal(base + i), "cycle_day": cd,
+                             "labels": _REST_LABEL if all_rest else (by_day[cd] or _REST_LABEL)})
+            else:
+                week.append({"date": from_ordinal(base + i), "cycle_day": None, "labels": []})
         grid.append(week)
     return first_sun, last_sat, max_day, grid
 
+def _header_strings(first_sun: dt.date, last_sat: dt.date) -> Tuple[str, str]:
+    months = cal.month_name[first_sun.month]
+    if first_sun.month != last_sat.month or first_sun.year != last_sat.year:
+        months += f" - {cal.month_name[last_sat.month]}"
+    year = str(first_sun.year) if first_sun.year == last_sat.year else f"{first_sun.year}-{last_sat.year}"
+    return months, year
+
 def _spell_route(route: str) -> str:
     r = route.strip().upper()
     mapping = {"PO": "by mouth", "IV": "intravenously", "SQ": "Inject SubQ", "IT": "Given during lumbar puncture"}
     return mapping.get(r, route)
 
+_docx: Optional[SimpleNamespace] = None
+# Raw WordprocessingML for the fixed table styling; "{}" takes nsdecls("w")
+_HEADER_SHD_XML = '<w:shd {} w:val="clear" w:color="auto" w:fill="000000"/>'
+_TBL_BORDERS_XML = "<w:tblBorders {}>" + "".join(
+    f'<w:{edge} w:val="single" w:sz="4" w:space="0" w:color="auto"/>'
+    for edge in ("top", "left", "bottom", "right", "insideH", "insideV")
+) + "</w:tblBorders>"
+# Calendar-cell paragraph: no spacing, 14pt run; cloned per cell instead of styled through python-docx
+_CELL_P_XML = ('<w:p {}><w:pPr><w:spacing w:before="0" w:after="0"/><w:jc w:val="{}"/></w:pPr>'
+               '{}<w:r><w:rPr>{}<w:sz w:val="28"/></w:rPr></w:r></w:p>')
+
+def _load_docx() -> Optional[SimpleNamespace]:
+    """python-docx names used by export_calendar_docx, imported once on first use (None if unavailable)."""
+    global _docx
+    if _docx is None:
+        try:
+            from docx import Document
+            from docx.shared import Pt, Inches, RGBColor
+            from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
+            from docx.enum.table import WD_TABLE_ALIGNMENT, WD_ROW_HEIGHT_RULE
+            from docx.oxml import parse_xml
+            from docx.oxml.ns import nsdecls, qn
+        except Exception: return None
+        _docx = SimpleNamespace(
+            Document=Document, Pt=Pt, Inches=Inches, RGBColor=RGBColor,
+            WD_ALIGN_PARAGRAPH=WD_ALIGN_PARAGRAPH, WD_LINE_SPACING=WD_LINE_SPACING,
+            WD_TABLE_ALIGNMENT=WD_TABLE_ALIGNMENT, WD_ROW_HEIGHT_RULE=WD_ROW_HEIGHT_RULE,
+            qn=qn, parse_xml=parse_xml,
+            header_shd_xml=_HEADER_SHD_XML.format(nsdecls("w")),
+            tbl_borders_xml=_TBL_BORDERS_XML.format(nsdecls("w")),
+            # the date line keeps the empty run that cell.text = "" used to leave
+            date_p=parse_xml(_CELL_P_XML.format(nsdecls("w"), "right", "<w:r/>", "<w:b/>")),
+            day_p=parse_xml(_CELL_P_XML.format(nsdecls("w"), "left", "", "<w:i/>")),
+            label_p=parse_xml(_CELL_P_XML.format(nsdecls("w"), "left", "", "<w:b/>")),
+            rest_p=parse_xml(_CELL_P_XML.format(nsdecls("w"), "left", "", "")),
+        )
+    return _docx
+
+def _add_cell_paragraph(tc, template, text: str) -> None:
+    p = copy.deepcopy(template)
+    p.r_lst[-1].text = text  # CT_R.text handles tabs/newlines like Run.text
+    tc.append(p)
+
 def export_calendar_docx(reg: Regimen, start: dt.date, cycle_len: int, out_path: Path, cycle_label: str, note: Optional[str] = None) -> bool:
-    try:
-        from docx import Document
-        from docx.shared import Pt, Inches, RGBColor
-        from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
-        from docx.enum.table import WD_TABLE_ALIGNMENT, WD_ROW_HEIGHT_RULE
-        from docx.oxml import OxmlElement
-        from docx.oxml.ns import qn
-    except Exception: return False
+    d = _load_docx()
+    if d is None: return False
+    Document, Pt, Inches, RGBColor = d.Document, d.Pt, d.Inches, d.RGBColor
+    WD_ALIGN_PARAGRAPH, WD_LINE_SPACING = d.WD_ALIGN_PARAGRAPH, d.WD_LINE_SPACING
+    WD_TABLE_ALIGNMENT, WD_ROW_HEIGHT_RULE = d.WD_TABLE_ALIGNMENT, d.WD_ROW_HEIGHT_RULE
+    qn = d.qn
 
     first_sun, last_sat, _, grid = compute_calendar_grid(reg, start, cycle_len)
-    months = cal.month_name[first_sun.month]
-    if first_sun.month != last_sat.month or first_sun.year != last_sat.year:
-        months += f" - {cal.month_name[last_sat.month]}"
-    year = str(first_sun.year) if first_sun.year == last_sat.year else f"{first_sun.year}-{last_sat.year}"
+    months, year = _header_strings(first_sun, last_sat)
 
     doc = Document()
     style = doc.styles['Normal']
@@ -405,58 +471,24 @@ def export_calendar_docx(reg: Regimen, start: dt.date, cycle_len: int, out_path:
         r.font.size = Pt(14)
         r.font.color.rgb = RGBColor(0xFF, 0xFF, 0xFF)
 
-        tcPr = cell._tc.get_or_add_tcPr()
-        shd = OxmlElement("w:shd")
-        shd.set(qn("w:val"), "clear")
-        shd.set(qn("w:color"), "auto")
-        shd.set(qn("w:fill"), "000000")
-        tcPr.append(shd)
+        cell._tc.get_or_add_tcPr().append(d.parse_xml(d.header_shd_xml))
 
     for wi, week in enumerate(grid):
         row = table.rows[wi + 2]
         row.height_rule = WD_ROW_HEIGHT_RULE.AT_LEAST
         row.height = Inches(1.0)
 
-        for di, cell_data in enumerate(week):
-            cell = row.cells[di]
-            cell.text = ""
-
-            p_date = cell.paragraphs[0]
-            p_date.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            p_date.paragraph_format.space_before = Pt(0)
-            p_date.paragraph_format.space_after = Pt(0)
-            rd = p_date.add_run(f"{cal.month_abbr[cell_data['date'].month]} {cell_data['date'].day}")
-            rd.bold = True
-            rd.font.size = Pt(14)
+        for cell, cell_data in zip(row.cells, week):
+            tc = cell._tc
+            tc.clear_content()
+            _add_cell_paragraph(tc, d.date_p, f"{cal.month_abbr[cell_data['date'].month]} {cell_data['date'].day}")
 
             if cell_data["cycle_day"] is not None:
-                p_day = cell.add_paragraph()
-                p_day.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                p_day.paragraph_format.space_before = Pt(0)
-                p_day.paragraph_format.space_after = Pt(0)
-                rday = p_day.add_run(f"Day {cell_data['cycle_day']}")
-                rday.italic = True
-                rday.font.size = Pt(14)
-
+                _add_cell_paragraph(tc, d.day_p, f"Day {cell_data['cycle_day']}")
                 for lab in cell_data["labels"]:
-                    p_lab = cell.add_paragraph()
-                    p_lab.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                    p_lab.paragraph_format.space_before = Pt(0)
-                    p_lab.paragraph_format.space_after = Pt(0)
-                    rl = p_lab.add_run(lab)
-                    rl.font.size = Pt(14)
-                    if lab.lower() != "rest": rl.bold = True
-
-    tbl_pr = table._element.tblPr
-    borders = OxmlElement("w:tblBorders")
-    for edge in ("top", "left", "bottom", "right", "insideH", "insideV"):
-        e = OxmlElement(f"w:{edge}")
-        e.set(qn("w:val"), "single")
-        e.set(qn("w:sz"), "4")
-        e.set(qn("w:space"), "0")
-        e.set(qn("w:color"), "auto")
-        borders.append(e)
-    tbl_pr.append(borders)
+                    _add_cell_paragraph(tc, d.rest_p if lab.lower() == "rest" else d.label_p, lab)
+
+    table._element.tblPr.append(d.parse_xml(d.tbl_borders_xml))
 
     doc.add_paragraph()
 
@@ -477,5 +509,7 @@ def export_calendar_docx(reg: Regimen, start: dt.date, cycle_len: int, out_path:
         run = p.add_run(sentence)
         run.font.size = Pt(12)
 
-    doc.save(out_path)
+    # One sequential zip write; a larger buffer keeps it to a few syscalls.
+    with open(out_path, "wb", buffering=_DOCX_WRITE_BUFFER) as f:
+        doc.save(f)
     return True
\ No newline at end of file
@@ -24,6 +24,7 @@ from typing import Optional, Dict, Any, List, Tuple
 import argparse
 import calendar
 import datetime as dt
+import functools
 import json
 import sys
 import tempfile
@@ -33,6 +34,30 @@ import re
 SCHEMA_VERSION = 2
 DEFAULT_DB = Path("regimenbank.json")
 
+# ASCII fast path for calendar filenames; see _safe_name()
+_SAFE_TABLE = {i: (chr(i) if chr(i).isalnum() or chr(i) in "-_" else "_") for i in range(128)}
+_UNSAFE_RE = re.compile(r"[^\w-]")  # same set for non-ASCII names: \w is isalnum() plus "_"
+
+# one text-calendar row: seven 10-wide left-aligned columns
+_CAL_ROW_FMT = " ".join(["{:<10}"] * 7)
+
+# static wizard menus, printed as-is on every pass of the edit loop
+_WIZARD_MENU = ("\nActions:\n"
+                "  1. Add a new agent\n"
+                "  2. Edit an existing agent\n"
+                "  3. Remove an agent\n"
+                "  4. Save and finish")
+_AGENT_ROUTES = ("IV", "PO", "SC", "IM", "IT", "IP", "Intra-arterial")
+_ROUTE_MENU = "\nRoute options:\n" + "".join(f"  {i}. {r}\n" for i, r in enumerate(_AGENT_ROUTES, 1)) + "  n. Other"
+_VEN_DURATIONS = ("7", "14", "18", "21", "28")
+_VEN_DURATION_MENU = "\nVenetoclax duration days:\n" + "".join(f"  {i}. {d}\n" for i, d in enumerate(_VEN_DURATIONS, 1)) + "  n. Other"
+
+# positive integer answer (leading zeros allowed)
+_POSINT_RE = re.compile(r"0*([1-9]\d*)")
+
+# YYYY-MM-DD or M/D/YY / M/D/YYYY
+_DATE_RE = re.compile(r"^(?:(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})/(\d{1,2})/(\d{2}|\d{4}))$")
+
 # ---------------- Models ----------------
 
 @dataclass
@@ -90,6 +115,7 @@ class RegimenBank:
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self.data: Dict[str, Any] = {}
+        self._names_cache: Optional[Tuple[str, ...]] = None
         self._load()
 
     def _load(self) -> None:
@@ -129,7 +155,10 @@ class RegimenBank:
 
     # Regimen ops
     def list_regimens(self) -> List[str]:
-        return sorted(self.data.get("regimens", {}).keys())
+        # sorted once, then reused until upsert/delete changes the names
+        if self._names_cache is None:
+            self._names_cache = tuple(sorted(self.data.get("regimens", {}).keys()))
+        return list(self._names_cache)
 
     def get_regimen(self, name: str) -> Optional[Regimen]:
         rec = self.data.get("regimens", {}).get(name.strip())
@@ -137,18 +166,23 @@ class RegimenBank:
 
     def upsert_regimen(self, regimen: Regimen) -> None:
         self.data.setdefault("regimens", {})[regimen.name] = regimen.to_dict()
+        self._names_cache = None
         self._save()
 
     def delete_regimen(self, name: str) -> bool:
         key = name.strip()
         if key in self.data.get("regimens", {}):
             del self.data["regimens"][key]
+            self._names_cache = None
             self._save()
             return True
         return False
 
 # ---------------- Helpers (dropdown-like + parsing) ----------------
 
+def _read_lower(prompt: str) -> str:
+    return input(prompt).strip().lower()
+
 def choose_from(prompt: str, options: List[str], allow_new: bool = False) -> Tuple[str, bool]:
     """
     Present a numbered list. Returns (value, is_new).
@@ -165,8 +199,8 @@ def choose_from(prompt: str, options: List[str], allow_new: bool = False) -> Tup
     if allow_new:
         print("  n. <Add new>")
     while True:
-        sel = input("Choose number" + (" or 'n' to add new: " if allow_new else ": ")).strip()
-        if allow_new and sel.lower() == "n":
+        sel = _read_lower("Choose number" + (" or 'n' to add new: " if allow_new else ": "))
+        if allow_new and sel == "n":
             val = input("Enter new name: ").strip()
             if val:
                 return val, True
@@ -189,6 +223,17 @@ def prompt_optional(label: str, prefill: Optional[str] = None) -> Optional[str]:
     v = input(f"{label}{f' [{prefill}]' if prefill else ''} (optional): ").strip()
     return v or prefill
 
+def _read_int(prompt: str, default: Optional[int] = None) -> int:
+    """Positive integer from input(); a blank answer returns default when one is given."""
+    while True:
+        s = input(prompt).strip()
+        if not s and default is not None:
+            return default
+        m = _POSINT_RE.fullmatch(s)
+        if m:
+            return int(m.group(1))
+        print("Enter a positive integer.")
+
 def parse_frequency_days(freq: str) -> List[int]:
     """
     Parse simple patterns like:
@@ -222,30 +267,45 @@ def parse_frequency_days(freq: str) -> List[int]:
     # unique + sorted
     return sorted(set(days))
 
-def read_date(prompt: str, default: Optional[dt.date] = None) -> dt.date:
+def _safe_name(name: str) -> str:
+    if name.isascii():
+        return name.translate(_SAFE_TABLE)
+    return _UNSAFE_RE.sub("_", name)
+
+def read_date(prompt: str, default: Optional[dt.date] = None, today: Optional[dt.date] = None) -> dt.date:
     """
     Accepts:
       YYYY-MM-DD
       M/D/YY or M/D/YYYY  (e.g., 10/23/25 or 1/1/2025)
       'today' or 't'
       '+N'  → N days from today
+    'today' is read once (or taken from the caller) so every answer agrees on it.
     """
+    if today is None:
+        today = dt.date.today()
     while True:
         hint = f" [{default.strftime('%m/%d/%y')}]" if default else ""
-        s = input(f"{prompt}{hint}: ").strip().lower()
+        s = _read_lower(f"{prompt}{hint}: ")
         if not s and default:
             return default
         if s in ("t", "today"):
-            return dt.date.today()
+            return today
         if s.startswith("+") and s[1:].isdigit():
-            return dt.date.today() + dt.timedelta(days=int(s[1:]))
+            return today + dt.timedelta(days=int(s[1:]))
 
-        # Try multiple date patterns
-        for fmt in ("%Y-%m-%d", "%m/%d/%y", "%m/%d/%Y"):
+        m = _DATE_RE.match(s)
+        if m:
+            iso_y, iso_m, iso_d, us_m, us_d, us_y = m.groups()
             try:
-                return dt.datetime.strptime(s, fmt).date()
+                if iso_y:
+                    return dt.date(int(iso_y), int(iso_m), int(iso_d))
+                year = int(us_y)
+                if len(us_y) == 2:
+                    # same pivot as strptime's %y
+                    year += 2000 if year < 69 else 1900
+                return dt.date(year, int(us_m), int(us_d))
             except ValueError:
-                continue
+                pass
         print("Enter date as YYYY-MM-DD, M/D/YY, M/D/YYYY, 'today', or +N (e.g., +7).")
 
 # ---------------- Regimen Wizard (Part 1) ----------------
@@ -262,7 +322,7 @@ def wizard(bank: RegimenBank) -> None:
 
     # If user picked a new AZA/VEN variant, optionally scaffold common agents
     if is_new and "ven" in reg_name.lower():
-        quick = input("Scaffold AZA/VEN agents now? [y/N]: ").strip().lower() == "y"
+        quick = _read_lower("Scaffold AZA/VEN agents now? [y/N]: ") == "y"
         if quick:
             # Azacitidine (you can edit later)
             aza = Chemotherapy(
@@ -276,26 +336,22 @@ def wizard(bank: RegimenBank) -> None:
             ven_dose = prompt_required("Venetoclax dose (e.g., 70 mg / 100 mg / 400 mg)")
 
             # Offer common durations like a dropdown, but accept actual day count too
-            common_durs = ["7", "14", "18", "21", "28"]
-            print("\nVenetoclax duration days:")
-            for i, d in enumerate(common_durs, 1):
-                print(f"  {i}. {d}")
-            print("  n. Other")
+            print(_VEN_DURATION_MENU)
 
             while True:
-                sel = input("Choose duration number, actual day count (e.g., 21), or 'n': ").strip().lower()
-                # Accept numeric day count directly
-                if sel.isdigit():
+                sel = _read_lower("Choose duration number, actual day count (e.g., 21), or 'n': ")
+                if sel.isdecimal():
                     val = int(sel)
+                    # Accept numeric day count directly
                     if 1 <= val <= 365:
                         ven_days = val
                         break
-                # Accept menu index
-                if sel.isdigit() and 1 <= int(sel) <= len(common_durs):
-                    ven_days = int(common_durs[int(sel) - 1])
-                    break
+                    # Accept menu index
+                    if 1 <= val <= len(_VEN_DURATIONS):
+                        ven_days = int(_VEN_DURATIONS[val - 1])
+                        break
                 if sel == "n":
-                    ven_days = int(prompt_required("Enter Venetoclax duration days (integer)"))
+                    ven_days = _read_int("Enter Venetoclax duration days (integer): ")
                     break
                 print("Invalid selection.")
 
@@ -309,74 +365,86 @@ def wizard(bank: RegimenBank) -> None:
             reg.upsert_chemo(aza)
             reg.upsert_chemo(ven)
 
-    # General edit loop
-    while True:
-        print("\nCurrent therapies:")
-        if not reg.therapies:
-            print("  (none yet)")
-        else:
-            for i, t in enumerate(reg.therapies, 1):
-                print(f"  {i}. {t.name} | {t.route} | {t.dose} | {t.frequency} | {t.duration}")
-
-        print("\nActions:")
-        print("  1. Add a new agent")
-        print("  2. Edit an existing agent")
-        print("  3. Remove an agent")
-        print("  4. Save and finish")
-        choice = input("Select action [1-4]: ").strip()
-
-        if choice == "1":
-            name = prompt_required("Agent name")
-            # route dropdown
-            routes = ["IV", "PO", "SC", "IM", "IT", "IP", "Intra-arterial"]
-            print("\nRoute options:")
-            for i, r in enumerate(routes, 1):
-                print(f"  {i}. {r}")
-            print("  n. Other")
-            while True:
-                rs = input("Choose route or 'n': ").strip().lower()
-                if rs.isdigit() and 1 <= int(rs) <= len(routes):
-                    route = routes[int(rs) - 1]; break
-                if rs == "n":
-                    route = prompt_required("Route"); break
-                print("Invalid selection.")
-            dose = prompt_required("Dose (e.g., 75 mg/m^2)")
-            freq = prompt_required("Frequency (e.g., Days 1–7 or Days 1,8,15)")
-            dur  = prompt_required("Duration (e.g., 7 days)")
-            reg.upsert_chemo(Chemotherapy(name, route, dose, freq, dur))
-
-        elif choice == "2":
-            if not reg.therapies:
-                print("No agents to edit."); continue
-            idx = input("Enter agent number to edit: ").strip()
-            if not (idx.isdigit() and 1 <= int(idx) <= len(reg.therapies)):
-                print("Invalid number."); continue
-            i = int(idx) - 1
-            t = reg.therapies[i]
-            t.name = prompt_required("Agent name", t.name)
-            t.route = prompt_required("Route", t.route)
-            t.dose = prompt_required("Dose", t.dose)
-            t.frequency = prompt_required("Frequency", t.frequency)
-            t.duration = prompt_required("Duration", t.duration)
-            reg.therapies[i] = t
-
-        elif choice == "3":
-            if not reg.therapies:
-                print("No agents to remove."); continue
-            idx = input("Enter agent number to remove: ").strip()
-            if idx.isdigit() and 1 <= int(idx) <= len(reg.therapies):
-                removed = reg.therapies.pop(int(idx) - 1)
-                print(f"Removed {removed.name}.")
+    # General edit loop; the therapy listing is re-rendered only after an edit
+    listing: Optional[str] = None
+    try:
+        while True:
+            if listing is None:
+                if not reg.therapies:
+                    listing = "\nCurrent therapies:\n  (none yet)\n"
+                else:
+                    listing = "\nCurrent therapies:\n" + "".join(
+                        f"  {i}. {t.name} | {t.route} | {t.dose} | {t.frequency} | {t.duration}\n"
+                        for i, t in enumerate(reg.therapies, 1))
+            sys.stdout.write(listing)
+
+            print(_WIZARD_MENU)
+            choice = input("Select action [1-4]: ").strip()
+
+            if choice == "1":
+                name = prompt_required("Agent name")
+                # route dropdown
+                print(_ROUTE_MENU)
+                while True:
+                    rs = _read_lower("Choose route or 'n': ")
+                    k = int(rs) - 1 if rs.isdecimal() else -1
+                    if 0 <= k < len(_AGENT_ROUTES):
+                        route = _AGENT_ROUTES[k]; break
+                    if rs == "n":
+                        route = prompt_required("Route"); break
+                    print("Invalid selection.")
+                dose = prompt_required("Dose (e.g., 75 mg/m^2)")
+                freq = prompt_required("Frequency (e.g., Days 1–7 or Days 1,8,15)")
+                dur  = prompt_required("Duration (e.g., 7 days)")
+                reg.upsert_chemo(Chemotherapy(name, route, dose, freq, dur))
+                listing = None
+
+            elif choice == "2":
+                if not reg.therapies:
+                    print("No agents to edit."); continue
+                idx = input("Enter agent number to edit: ").strip()
+                i = int(idx) - 1 if idx.isdecimal() else -1
+                if not 0 <= i < len(reg.therapies):
+                    print("Invalid number."); continue
+                t = reg.therapies[i]
+                t.name = prompt_required("Agent name", t.name)
+                t.route = prompt_required("Route", t.route)
+                t.dose = prompt_required("Dose", t.dose)
+                t.frequency = prompt_required("Frequency", t.frequency)
+                t.duration = prompt_required("Duration", t.duration)
+                reg.therapies[i] = t
+                listing = None
+
+            elif choice == "3":
+                if not reg.therapies:
+                    print("No agents to remove."); continue
+                idx = input("Enter agent number to remove: ").strip()
+                i = int(idx) - 1 if idx.isdecimal() else -1
+                if 0 <= i < len(reg.therapies):
+                    removed = reg.therapies.pop(i)
+                    print(f"Removed {removed.name}.")
+                    listing = None
+                else:
+                    print("Invalid number.")
+
+            elif choice == "4":
+                # Save and exit
+                bank.upsert_regimen(reg)
+                print(f"\nSaved regimen '{reg.name}'.")
+                return
             else:
-                print("Invalid number.")
-
-        elif choice == "4":
-            # Save and exit
+                print("Choose 1–4.")
+    except KeyboardInterrupt:
+        # Ctrl-C mid-session: offer to keep the edits before the CLI exits
+        print()
+        try:
+            keep = _read_lower(f"Save changes to '{reg.name}' before exiting? [y/N]: ") == "y"
+        except (KeyboardInterrupt, EOFError):
+            keep = False
+        if keep:
             bank.upsert_regimen(reg)
             print(f"\nSaved regimen '{reg.name}'.")
-            return
-        else:
-            print("Choose 1–4.")
+        raise
 
 # ---------------- Calendar (Part 2) ----------------
 
@@ -418,7 +486,7 @@ def make_calendar(reg: Regimen, start: dt.date, cycle_length: int) -> str:
 
     d = first_week_sun
     while d <= last_week_sat:
-        week_cells: List[str] = []
+        week_cells: List[List[str]] = []
         for _ in range(7):
             cell_lines = []
             # Calendar date
@@ -433,20 +501,12 @@ def make_calendar(reg: Regimen, start: dt.date, cycle_length: int) -> str:
                             cell_lines.append(agent)
                     else:
                         cell_lines.append("Rest")
-            cell = "\n".join(cell_lines)
-            week_cells.append(cell)
+            week_cells.append(cell_lines)
             d += dt.timedelta(days=1)
-        # format fixed-width columns (rough)
-        col_width = 10
-        block_lines = []
-        max_lines = max(cell.count("\n") + 1 for cell in week_cells)
+        # format fixed-width columns (rough), one format call per printed row
+        max_lines = max(len(cell) for cell in week_cells)
         for row_idx in range(max_lines):
-            row_parts = []
-            for cell in week_cells:
-                parts = cell.split("\n")
-                row_parts.append((parts[row_idx] if row_idx < len(parts) else "").ljust(col_width))
-            block_lines.append(" ".join(row_parts))
-        out.extend(block_lines)
+            out.append(_CAL_ROW_FMT.format(*(cell[row_idx] if row_idx < len(cell) else "" for cell in week_cells)))
         out.append("")  # spacer between weeks
     return "\n".join(out)
 
@@ -465,30 +525,32 @@ def calendar_wizard(bank: RegimenBank) -> None:
         print(f"Regimen '{reg_name}' not found.")
         return
 
-    start = read_date("Cycle start date", default=dt.date.today())
-    while True:
-        s = input("Cycle length in days [28]: ").strip()
-        if not s:
-            cycle_len = 28
-            break
-        if s.isdigit() and int(s) >= 1:
-            cycle_len = int(s)
-            break
-        print("Enter a positive integer.")
+    today = dt.date.today()
+    start = read_date("Cycle start date", default=today, today=today)
+    cycle_len = _read_int("Cycle length in days [28]: ", 28)
 
     cal_txt = make_calendar(reg, start, cycle_len)
     print("\n" + cal_txt + "\n")
 
-    want = input("Save to file? [y/N]: ").strip().lower()
+    try:
+        want = _read_lower("Save to file? [y/N]: ")
+    except KeyboardInterrupt:
+        print()
+        want = "n"
     if want == "y":
-        safe_name = "".join(c if c.isalnum() or c in ("-", "_") else "_" for c in reg.name)
+        safe_name = _safe_name(reg.name)
         out = f"{safe_name}_cycle1_{start.isoformat()}.txt"
-        Path(out).write_text(cal_txt, encoding="utf-8")
+        with open(out, "wb", buffering=0) as f:
+            view = memoryview(cal_txt.encode("utf-8"))
+            while view:  # raw writes may be partial
+                view = view[f.write(view):]
         print(f"Saved: {out}")
 
 # ---------------- CLI ----------------
 
+@functools.lru_cache(maxsize=1)
 def build_parser() -> argparse.ArgumentParser:
+    # Built once per process; parse_args() leaves the parser untouched and returns a fresh Namespace.
     p = argparse.ArgumentParser(description="JSON-backed chemotherapy regimen bank with variants + calendar")
     p.add_argument("--db", type=Path, default=DEFAULT_DB, help="Path to JSON DB (default: regimenbank.json)")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -506,17 +568,18 @@ def build_parser() -> argparse.ArgumentParser:
     return p
 
 def pretty_print_regimen(reg: Regimen) -> None:
-    print(f"\nRegimen: {reg.name}")
+    lines = [f"\nRegimen: {reg.name}"]
     if reg.disease_state:
-        print(f"Disease State: {reg.disease_state}")
+        lines.append(f"Disease State: {reg.disease_state}")
     if not reg.therapies:
-        print("Therapies: (none)")
-        return
-    print("Therapies:")
-    for i, t in enumerate(reg.therapies, 1):
-        print(f"  {i}. {t.name} | Route: {t.route} | Dose: {t.dose} | "
-              f"Freq: {t.frequency} | Duration: {t.duration}")
-    print("")
+        lines.append("Therapies: (none)")
+    else:
+        lines.append("Therapies:")
+        lines.extend(f"  {i}. {t.name} | Route: {t.route} | Dose: {t.dose} | "
+                     f"Freq: {t.frequency} | Duration: {t.duration}"
+                     for i, t in enumerate(reg.therapies, 1))
+        lines.append("")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 def main(argv: List[str]) -> int:
     args = build_parser().parse_args(argv)
@@ -552,4 +615,8 @@ def main(argv: List[str]) -> int:
     return 1
 
 if __name__ == "__main__":
-    sys.exit(main(sys.argv[1:]))
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        print()
+        sys.exit(130)